@@ -3,17 +3,10 @@
 
 
 import sys
-from scraped import ScrapedFlight
 import pdflight
-from joblib import Parallel, delayed
-import pickle
 
 
-flights = Parallel(n_jobs=-1)(
-    delayed(ScrapedFlight.create_from_file)(i) for i in sys.argv
-)
-
-
-(md, fl, th) = pdflight.flights_to_dataframes(flight for flight in flights if flight.valid)
-with open('store.pkl', 'wb') as f:
-    pickle.dump({'md': md, 'fl': fl, 'th': th}, f)
+(md, fl, th) = pdflight.flight_files_to_dataframes(sys.argv[1:])
+md.reset_index().to_feather('md.feather', compression='zstd')
+fl.reset_index().to_feather('fl.feather', compression='zstd')
+th.reset_index().to_feather('th.feather', compression='zstd')
@@ -1,113 +1,205 @@
-from typing import List, Tuple
+import hashlib
+import inspect
+import os
+from operator import attrgetter, methodcaller
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
+from igc_lib.igc_lib import FlightParsingConfig
+from joblib import Memory, Parallel, delayed
+from numba import njit
 
 from scraped import ScrapedFlight
 
+_FIX_DTYPES: Dict[str, type] = {
+    "lat": np.float32,
+    "lon": np.float32,
+    "alt": np.float32,
+    "gsp": np.float32,
+    "bearing": np.float32,
+    "bearing_change_rate": np.float32,
+    "flying": np.bool_,
+    "circling": np.bool_,
+}
+_FIX_COLUMNS: List[str] = list(_FIX_DTYPES)
+_fix_values = attrgetter(*_FIX_COLUMNS)
+_fix_timestamp = attrgetter("timestamp")
+_thermal_timestamp = attrgetter("enter_fix.timestamp")
+_thermal_time_change = methodcaller("time_change")
+_CACHE_SOURCES: List[str] = [
+    __file__,
+    inspect.getfile(ScrapedFlight),
+    inspect.getfile(FlightParsingConfig),
+]
+_CACHE_VERSION: str = hashlib.sha256(
+    b"".join(Path(source).read_bytes() for source in _CACHE_SOURCES)
+).hexdigest()
+_CACHE_BYTES_LIMIT: str = "2G"
+_memory = Memory(Path(__file__).with_name(".cache"), compress=3, verbose=0)
 
-def flights_to_dataframes(
-    flights: List[ScrapedFlight],
-) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series]:
-    metadata_dfs = []
-    fixes_dfs = []
-    thermals_series_list = []
-
-    for flight in flights:
-        if not flight.valid:
-            raise ValueError("Flight is invalid. Check flight.notes for details.")
-
-        metadata_df = pd.DataFrame(
-            {
-                "competition": [flight.competition],
-                "competition_class": [flight.competition_class],
-                "pilot": [flight.pilot],
-                "points": [flight.points],
-                "start": [
-                    pd.to_datetime(flight.start)
-                    .tz_localize("Europe/Vienna")
-                    .tz_convert("UTC")
-                ],
-                "finish": [
-                    pd.to_datetime(flight.finish)
-                    .tz_localize("Europe/Vienna")
-                    .tz_convert("UTC")
-                ],
-            },
-            index=pd.Index(
-                [flight.fr_manuf_code + flight.fr_uniq_id + flight.date],
-                name="flight",
-            ),
-        )
-        metadata_dfs.append(metadata_df)
-
-        fixes_df = pd.DataFrame(
-            (
-                {
-                    "lat": fix.lat,
-                    "lon": fix.lon,
-                    "alt": fix.alt,
-                    "gsp": fix.gsp,
-                    "bearing": fix.bearing,
-                    "bearing_change_rate": fix.bearing_change_rate,
-                    "flying": fix.flying,
-                    "circling": fix.circling,
-                }
-                for fix in flight.fixes
-            ),
-            index=pd.to_datetime(
-                [fix.timestamp for fix in flight.fixes], unit="s", utc=True
-            ),
-        )
 
-        fixes_df = fixes_df.resample("1s").nearest()
+@njit(cache=True)
+def _nearest_indexer(raw_secs: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    nearest = np.empty(len(grid), dtype=np.int64)
+    last = len(raw_secs) - 1
+    i = 0
+    for k in range(len(grid)):
+        while i < last and raw_secs[i + 1] < grid[k]:
+            i += 1
+        if i < last and raw_secs[i + 1] - grid[k] <= grid[k] - raw_secs[i]:
+            nearest[k] = i + 1
+        else:
+            nearest[k] = i
+    return nearest
+
+
+def _seconds_to_datetime_level(index: pd.MultiIndex) -> pd.MultiIndex:
+    seconds = np.asarray(index.levels[1], dtype=np.int64)
+    datetimes = pd.DatetimeIndex(seconds.view("datetime64[s]")).tz_localize("UTC")
+    return index.set_levels(datetimes.as_unit("ns"), level="datetime")
 
-        fixes_df.index = pd.MultiIndex.from_arrays(
-            [
-                [flight.fr_manuf_code + flight.fr_uniq_id + flight.date]
-                * len(fixes_df.index),
-                fixes_df.index,
-            ],
-            names=["flight", "datetime"],
-        )
-        fixes_dfs.append(fixes_df)
 
-        thermals_series = pd.Series(
-            [
-                pd.to_timedelta(thermal.time_change(), unit="s")
-                for thermal in flight.thermals
+def _flight_to_dataframes(
+    flight: ScrapedFlight,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series]:
+    if not flight.valid:
+        raise ValueError("Flight is invalid. Check flight.notes for details.")
+
+    metadata_df = pd.DataFrame(
+        {
+            "competition": [flight.competition],
+            "competition_class": [flight.competition_class],
+            "pilot": [flight.pilot],
+            "points": [flight.points],
+            "start": [
+                pd.to_datetime(flight.start)
+                .tz_localize("Europe/Vienna")
+                .tz_convert("UTC")
+            ],
+            "finish": [
+                pd.to_datetime(flight.finish)
+                .tz_localize("Europe/Vienna")
+                .tz_convert("UTC")
             ],
-            index=pd.MultiIndex.from_arrays(
-                [
-                    [flight.fr_manuf_code + flight.fr_uniq_id + flight.date]
-                    * len(flight.thermals),
-                    pd.to_datetime(
-                        [thermal.enter_fix.timestamp for thermal in flight.thermals],
-                        unit="s",
-                        utc=True,
-                    ),
-                ],
-                names=["flight", "datetime"],
+        },
+        index=pd.Index(
+            [flight.fr_manuf_code + flight.fr_uniq_id + flight.date],
+            name="flight",
+        ),
+    )
+
+    raw_secs = np.fromiter(
+        map(_fix_timestamp, flight.fixes), dtype=np.int64, count=len(flight.fixes)
+    )
+    order = np.arange(len(raw_secs))
+    if np.any(np.diff(raw_secs) <= 0):
+        raw_secs, order = np.unique(raw_secs, return_index=True)
+    grid = np.arange(raw_secs[0], raw_secs[-1] + 1)
+    nearest = order[_nearest_indexer(raw_secs, grid)]
+    fixes_df = pd.DataFrame(
+        {
+            column: np.asarray(values, dtype=_FIX_DTYPES[column])[nearest]
+            for column, values in zip(
+                _FIX_COLUMNS, zip(*map(_fix_values, flight.fixes))
+            )
+        },
+        index=grid,
+    )
+
+    n_thermals = len(flight.thermals)
+    thermals_series = pd.Series(
+        pd.to_timedelta(
+            np.fromiter(
+                map(_thermal_time_change, flight.thermals),
+                dtype=np.float64,
+                count=n_thermals,
             ),
-            name="duration",
-        )
-        thermals_series_list.append(thermals_series)
+            unit="s",
+        ),
+        index=np.fromiter(
+            map(_thermal_timestamp, flight.thermals),
+            dtype=np.int64,
+            count=n_thermals,
+        ),
+        name="duration",
+    )
+    return metadata_df, fixes_df, thermals_series
+
+
+@_memory.cache
+def _flight_file_to_dataframes(
+    filename: str, mtime_ns: int, cache_version: str
+) -> Optional[Tuple[pd.DataFrame, pd.DataFrame, pd.Series]]:
+    flight = ScrapedFlight.create_from_file(filename)
+    if not flight.valid:
+        return None
+    return _flight_to_dataframes(flight)
+
+
+def _concat_flight_dataframes(
+    results: Iterable[Optional[Tuple[pd.DataFrame, pd.DataFrame, pd.Series]]],
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series]:
+    metadata_dfs, fixes_dfs, thermals_series_list = zip(
+        *(result for result in results if result is not None)
+    )
+
+    metadata_df = pd.concat(metadata_dfs)
+    fixes_df = pd.concat(
+        fixes_dfs,
+        keys=metadata_df.index,
+        names=["flight", "datetime"],
+    )
+    fixes_df.index = _seconds_to_datetime_level(fixes_df.index)
+    thermals_series = pd.concat(
+        thermals_series_list,
+        keys=metadata_df.index,
+        names=["flight", "datetime"],
+    )
+    thermals_series.index = _seconds_to_datetime_level(thermals_series.index)
 
     return (
-        pd.concat(metadata_dfs).sort_index(),
-        pd.concat(fixes_dfs).sort_index(),
-        pd.concat(thermals_series_list).sort_index(),
+        metadata_df.sort_index(),
+        fixes_df.sort_index(),
+        thermals_series.sort_index(),
     )
 
 
+def flights_to_dataframes(
+    flights: Iterable[ScrapedFlight],
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series]:
+    return _concat_flight_dataframes(
+        Parallel(n_jobs=-1, prefer="processes", return_as="generator")(
+            delayed(_flight_to_dataframes)(flight) for flight in flights
+        )
+    )
+
+
+def flight_files_to_dataframes(
+    filenames: Iterable[str],
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series]:
+    dataframes = _concat_flight_dataframes(
+        Parallel(n_jobs=-1, prefer="processes", return_as="generator")(
+            delayed(_flight_file_to_dataframes)(
+                os.path.abspath(filename),
+                os.stat(filename).st_mtime_ns,
+                _CACHE_VERSION,
+            )
+            for filename in filenames
+        )
+    )
+    _memory.reduce_size(bytes_limit=_CACHE_BYTES_LIMIT)
+    return dataframes
+
+
 def shift_datetime(i, dt):
     return (i[0], (i[1] + dt))
 
 
 def in_task(df: pd.DataFrame, md: pd.DataFrame) -> pd.DataFrame:
-    return (
-        df.index.droplevel("datetime").map(md["start"])
-        <= df.index.get_level_values("datetime")
-    ) & (
-        df.index.get_level_values("datetime")
-        < df.index.droplevel("datetime").map(md["finish"])
+    flights = df.index.droplevel("datetime")
+    datetimes = df.index.get_level_values("datetime")
+    return (flights.map(md["start"]) <= datetimes) & (
+        datetimes < flights.map(md["finish"])
     )
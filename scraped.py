@@ -1,6 +1,8 @@
-import math
+from operator import attrgetter
 from pathlib2 import Path
-from typing import List, Optional, Type
+from typing import Callable, Dict, List, Optional, Type
+
+import numpy as np
 
 from igc_lib.igc_lib import Flight, FlightParsingConfig, GNSSFix
 
@@ -10,35 +12,32 @@ class ScrapedFlight(Flight):
         config: FlightParsingConfig = config_class()
         fixes: List[GNSSFix] = []
         a_records: List[str] = []
+        b_records: List[str] = []
         i_records: List[str] = []
         h_records: List[str] = []
         l_records: List[str] = []
         abs_filename: Path = Path(filename).expanduser().absolute()
-        with abs_filename.open("r", encoding="ISO-8859-1") as flight_file:
-            for line in flight_file:
-                line = line.replace("\n", "").replace("\r", "")
-                if not line:
-                    continue
-                if line[0] == "A":
-                    a_records.append(line)
-                elif line[0] == "B":
-                    fix: Optional[GNSSFix] = GNSSFix.build_from_B_record(line, index=len(fixes))
-                    if fix is not None:
-                        if fixes and math.fabs(fix.rawtime - fixes[-1].rawtime) < 1e-5:
-                            # The time did not change since the previous fix.
-                            # Ignore this fix.
-                            pass
-                        else:
-                            fixes.append(fix)
-                elif line[0] == "I":
-                    i_records.append(line)
-                elif line[0] == "H":
-                    h_records.append(line)
-                elif line[0] == "L":
-                    l_records.append(line)
-                else:
-                    # Do not parse any other types of IGC records
-                    pass
+        handlers: Dict[str, Callable[[str], None]] = {
+            "A": a_records.append,
+            "B": b_records.append,
+            "I": i_records.append,
+            "H": h_records.append,
+            "L": l_records.append,
+        }
+        for line in abs_filename.read_bytes().splitlines():
+            handler = handlers.get(line[:1].decode("ISO-8859-1"))
+            if handler is not None:
+                handler(line.decode("ISO-8859-1"))
+        for record in b_records:
+            fix: Optional[GNSSFix] = GNSSFix.build_from_B_record(record, index=len(fixes))
+            if fix is not None:
+                fixes.append(fix)
+        rawtimes: np.ndarray = np.fromiter(map(attrgetter("rawtime"), fixes), dtype=np.float64, count=len(fixes))
+        keep: np.ndarray = np.flatnonzero(np.diff(rawtimes, prepend=np.nan) != 0)
+        if len(keep) != len(fixes):
+            fixes = [fixes[i] for i in keep]
+            for index, fix in enumerate(fixes):
+                fix.index = index
         flight: ScrapedFlight = ScrapedFlight(
             fixes, a_records, h_records, l_records, i_records, config
         )
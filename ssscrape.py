@@ -6,30 +6,42 @@ from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from typing import Iterator, Tuple
 import requests_cache
+import soupsieve
 import locale
 from unidecode import unidecode
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_URL = "https://www.soaringspot.com"
+PAGE_EXPIRE_AFTER = 86400
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_INTERVAL = 1.0
+TASK_LINK_SELECTOR = soupsieve.compile('table a[href*="/task-"]')
+HEADER_ROW_SELECTOR = soupsieve.compile("table thead tr")
+BODY_ROW_SELECTOR = soupsieve.compile("table tbody tr")
 
 
 class SoaringSpotScraper(requests_cache.CachedSession):
     def __init__(self):
-        super().__init__()
+        super().__init__(backend="sqlite", expire_after=requests_cache.NEVER_EXPIRE)
         locale.setlocale(locale.LC_ALL, "en_US.UTF-8")
         self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+            "Accept-Encoding": "gzip, deflate",
         }
+        self._download_lock = threading.Lock()
+        self._last_download = 0.0
 
     def get_soup(self, url: str) -> BeautifulSoup:
-        response = self.get(url, headers=self.headers)
+        response = self.get(url, headers=self.headers, expire_after=PAGE_EXPIRE_AFTER)
         response.raise_for_status()
-        return BeautifulSoup(response.text, "html.parser")
+        return BeautifulSoup(response.text, "lxml")
 
     def get_task_days(self, competition_url: str) -> list[str]:
         soup = self.get_soup(competition_url)
         task_links = []
-        for link in soup.select('table a[href*="/task-"]'):
+        for link in TASK_LINK_SELECTOR.select(soup):
             href = link.get("href")
             if href and href not in task_links:
                 task_links.append(href)
@@ -46,8 +58,8 @@ class SoaringSpotScraper(requests_cache.CachedSession):
         date_match = re.search(r"-\d+-on-(\d{4}-\d{2}-\d{2})$", url_info[7])
         date_str = date_match.group(1)
 
-        headers = {header.get_text(strip=True): i for i, header in enumerate(soup.select("table thead tr")[0].find_all("th"))}
-        for row in soup.select("table tbody tr"):
+        headers = {header.get_text(strip=True): i for i, header in enumerate(HEADER_ROW_SELECTOR.select_one(soup).find_all("th"))}
+        for row in BODY_ROW_SELECTOR.select(soup):
             cols = row.find_all("td")
             start_time = cols[headers["Start"]].get_text(strip=True)
             finish_time = cols[headers["Finish"]].get_text(strip=True)
@@ -59,7 +71,7 @@ class SoaringSpotScraper(requests_cache.CachedSession):
             download_link = row.find("a")
             if download_link:
                 data_content = download_link["data-content"]
-                soup = BeautifulSoup(data_content, "html.parser")
+                soup = BeautifulSoup(data_content, "lxml")
                 a_tags = soup.find_all("a")
                 igc_url = urljoin(BASE_URL, a_tags[1]["href"])
             else:
@@ -85,11 +97,18 @@ class SoaringSpotScraper(requests_cache.CachedSession):
         new_content += f"LSCR::CLASS:{competition_class}\r\n"
         return igc_content + unidecode(new_content).encode("ascii")
 
+    def _wait_for_download_slot(self) -> None:
+        with self._download_lock:
+            delay = self._last_download + DOWNLOAD_INTERVAL - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._last_download = time.monotonic()
+
     def download_igc_data(self, url: str) -> Tuple[str, bytes]:
+        if not self.cache.contains(url=url):
+            self._wait_for_download_slot()
         response = self.get(url)
         response.raise_for_status()
-        if not response.from_cache:
-            time.sleep(1)
 
         content_disposition = response.headers["content-disposition"]
         filename = content_disposition.split("filename=")[1].strip('"')
@@ -105,13 +124,13 @@ class SoaringSpotScraper(requests_cache.CachedSession):
         print(f"Starting scrape of competition: {competition_url}")
         task_days = self.get_task_days(competition_url)
         print(f"Found {len(task_days)} task days")
-        for day_url in task_days:
-            print(f"\nProcessing task day: {day_url}")
-            igc_data = self.get_pilot_igc_links(day_url)
-            for igc_url, start_time, finish_time, contestant, points, competition, competition_class in igc_data:
-                if igc_url:
-                    print(f"Downloading: {igc_url}")
-                    filename, content = self.download_igc_data(igc_url)
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            for day_url in task_days:
+                print(f"\nProcessing task day: {day_url}")
+                igc_data = [row for row in self.get_pilot_igc_links(day_url) if row[0]]
+                downloads = executor.map(self.download_igc_data, [row[0] for row in igc_data])
+                for (igc_url, start_time, finish_time, contestant, points, competition, competition_class), (filename, content) in zip(igc_data, downloads):
+                    print(f"Downloaded: {igc_url}")
                     content = self.append_times_to_igc(
                         content, start_time, finish_time, contestant, points, competition, competition_class
                     )